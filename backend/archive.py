@@ -0,0 +1,287 @@
+# backend/archive.py
+"""Retention for nutrition_records and uploads.
+
+    python -m backend.archive --keep-months 12 [--dir archive] [--dry-run]
+
+Whole months older than the retention window are appended to
+`<dir>/<table>/<YYYY-MM>.ndjson.gz` and then removed from the database: on
+Postgres the month's partition is detached and dropped, on SQLite (no
+partitions) the month's rows are deleted. Uploads trail records by one month so
+an upload is never archived before the records that point at it. On Postgres
+the job also pre-creates partitions for the coming months.
+
+`iter_records()` reads archived and live records as one stream for export or
+summary code.
+"""
+from __future__ import annotations
+
+import argparse, gzip, json, os
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+from typing import Iterator, Optional
+
+from sqlalchemy import Table, delete, func, select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from .db import engine
+from .models import NutritionRecord, Upload
+from .responses import dumps
+
+try:
+    import orjson  # type: ignore
+    _loads = orjson.loads
+except ImportError:  # optional speedup
+    _loads = json.loads
+
+ARCHIVE_DIR = Path(os.getenv("NUTRISNAP_ARCHIVE_DIR", "archive"))
+MONTHS_AHEAD = 3
+
+# table -> partition/timestamp column
+TABLES: dict[str, tuple[Table, str]] = {
+    "nutrition_records": (NutritionRecord.__table__, "created_at"),  # type: ignore[dict-item]
+    "uploads": (Upload.__table__, "uploaded_at"),  # type: ignore[dict-item]
+}
+
+
+def _add_month(d: date, n: int = 1) -> date:
+    y, m = divmod(d.month - 1 + n, 12)
+    return date(d.year + y, m + 1, 1)
+
+
+def _partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month:%Y_%m}"
+
+
+def _is_postgres(conn: Connection) -> bool:
+    return conn.dialect.name == "postgresql"
+
+
+def ensure_partitions(conn: Connection, months_ahead: int = MONTHS_AHEAD) -> None:
+    """Create this month's and the next `months_ahead` partitions (Postgres only).
+
+    If the job has not run for a while, rows for a missing month sit in the
+    DEFAULT partition, and Postgres refuses to create the month's partition
+    over them. Those months are created with the default detached, and the
+    rows are moved into the new partition before the default is re-attached.
+    """
+    if not _is_postgres(conn):
+        return
+    start = date.today().replace(day=1)
+    for name in TABLES:
+        _, column = TABLES[name]
+        default = f"{name}_default"
+        for i in range(months_ahead + 1):
+            month = _add_month(start, i)
+            partition = _partition_name(name, month)
+            if conn.execute(text("SELECT to_regclass(:p)"), {"p": partition}).scalar():
+                continue
+            bounds = f"FROM ('{month}') TO ('{_add_month(month)}')"
+            in_month = f"{column} >= '{month}' AND {column} < '{_add_month(month)}'"
+            stranded = conn.execute(text(f"SELECT EXISTS (SELECT 1 FROM {default} WHERE {in_month})")).scalar()
+            if not stranded:
+                conn.execute(text(f"CREATE TABLE {partition} PARTITION OF {name} FOR VALUES {bounds}"))
+                continue
+            conn.execute(text(f"ALTER TABLE {name} DETACH PARTITION {default}"))
+            conn.execute(text(f"CREATE TABLE {partition} PARTITION OF {name} FOR VALUES {bounds}"))
+            conn.execute(text(f"INSERT INTO {name} SELECT * FROM {default} WHERE {in_month}"))
+            conn.execute(text(f"DELETE FROM {default} WHERE {in_month}"))
+            conn.execute(text(f"ALTER TABLE {name} ATTACH PARTITION {default} DEFAULT"))
+
+
+def _partition_months(conn: Connection, name: str) -> list[date]:
+    """Months that have their own partition of `name` (Postgres only)."""
+    if not _is_postgres(conn):
+        return []
+    prefix = f"{name}_p"
+    partitions = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid"
+        " WHERE i.inhparent = to_regclass(:t)"
+    ), {"t": name}).scalars()
+    return [datetime.strptime(p[len(prefix):], "%Y_%m").date() for p in partitions if p.startswith(prefix)]
+
+
+def _months_before(conn: Connection, name: str, cutoff: date) -> list[date]:
+    """Every month before `cutoff` that holds rows of `name` or has a partition of it.
+
+    Months from the oldest row onward are all visited; on Postgres, older
+    (empty) partitions are added so they get dropped too.
+    """
+    table, column = TABLES[name]
+    col = table.c[column]
+    months = {m for m in _partition_months(conn, name) if m < cutoff}
+    oldest = conn.execute(select(func.min(col)).where(col < cutoff)).scalar()
+    if oldest is not None:
+        month = oldest.date().replace(day=1)
+        while month < cutoff:
+            months.add(month)
+            month = _add_month(month)
+    return sorted(months)
+
+
+def _count_month(conn: Connection, name: str, month: date) -> int:
+    table, column = TABLES[name]
+    col = table.c[column]
+    q = select(func.count()).select_from(table).where(col >= month, col < _add_month(month))
+    return conn.execute(q).scalar_one()
+
+
+def _drop_partition(conn: Connection, name: str, month: date) -> bool:
+    """Detach and drop `name`'s partition for `month`; False if there is none."""
+    partition = _partition_name(name, month)
+    if not (_is_postgres(conn) and conn.execute(text("SELECT to_regclass(:p)"), {"p": partition}).scalar()):
+        return False
+    conn.execute(text(f"ALTER TABLE {name} DETACH PARTITION {partition}"))
+    conn.execute(text(f"DROP TABLE {partition}"))
+    return True
+
+
+def archive_month(conn: Connection, name: str, month: date, archive_dir: Path = ARCHIVE_DIR) -> int:
+    """Append one month of `name` to its archive file, then drop it from the database.
+
+    An empty month writes nothing, but its partition (if any) is still dropped.
+    """
+    table, column = TABLES[name]
+    col = table.c[column]
+    in_month = (col >= month) & (col < _add_month(month))
+
+    n = _count_month(conn, name, month)
+    if n == 0:
+        _drop_partition(conn, name, month)
+        return 0
+
+    path = archive_dir / name / f"{month:%Y-%m}.ndjson.gz"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # append: a rerun after a crash may duplicate rows, never lose them (readers dedupe by id)
+    rows = conn.execute(select(table).where(in_month), execution_options={"stream_results": True})
+    with open(path, "ab") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="ab") as gz:
+            for row in rows.mappings():
+                gz.write(dumps(dict(row)) + b"\n")
+        raw.flush()
+        os.fsync(raw.fileno())
+
+    if not _drop_partition(conn, name, month):
+        conn.execute(delete(table).where(in_month))
+    return n
+
+
+def run(keep_months: int = 12, archive_dir: Path = ARCHIVE_DIR,
+        months_ahead: int = MONTHS_AHEAD, dry_run: bool = False) -> None:
+    cutoff = _add_month(date.today().replace(day=1), -keep_months)
+    cutoffs = {"nutrition_records": cutoff, "uploads": _add_month(cutoff, -1)}
+
+    with engine.begin() as conn:
+        if not dry_run:
+            ensure_partitions(conn, months_ahead)
+        plan = {name: _months_before(conn, name, c) for name, c in cutoffs.items()}
+        partitions = {name: set(_partition_months(conn, name)) for name in cutoffs}
+
+    for name, months in plan.items():
+        for month in months:
+            if dry_run:
+                with engine.connect() as conn:
+                    n = _count_month(conn, name, month)
+                if n:
+                    print(f"Would archive {n} {name} rows from {month:%Y-%m}.")
+                elif month in partitions[name]:
+                    print(f"Would drop empty partition {_partition_name(name, month)}.")
+                continue
+            with engine.begin() as conn:  # one transaction per month
+                n = archive_month(conn, name, month, archive_dir)
+            if n:
+                print(f"Archived {n} {name} rows from {month:%Y-%m}.")
+
+
+# ---------- Readers ----------
+# A rerun after a crash can append a month twice, or leave it both archived and
+# live, so readers dedupe by id -- one month at a time, to keep memory flat.
+def _midnight(d: date) -> datetime:
+    return datetime(d.year, d.month, d.day)
+
+
+def _month_of(path: Path) -> date:
+    return datetime.strptime(path.name.split(".")[0], "%Y-%m").date()
+
+
+def _archived_months(name: str, since: Optional[datetime], until: Optional[datetime],
+                     archive_dir: Path) -> Iterator[tuple[date, Path]]:
+    for path in sorted((archive_dir / name).glob("*.ndjson.gz")):
+        month = _month_of(path)
+        if since and _add_month(month) <= since.date():
+            continue
+        if until and month > until.date():
+            break
+        yield month, path
+
+
+def _read_month(path: Path, column: str, since: Optional[datetime], until: Optional[datetime],
+                seen: set[int]) -> Iterator[dict]:
+    """Rows of one archive file in [since, until), skipping (and adding to) `seen` ids."""
+    with gzip.open(path, "rb") as fh:
+        for line in fh:
+            row = _loads(line)
+            if row["id"] in seen:
+                continue
+            seen.add(row["id"])
+            row[column] = ts = datetime.fromisoformat(row[column])
+            if (since and ts < since) or (until and ts >= until):
+                continue
+            yield row
+
+
+def iter_archived(name: str, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                  archive_dir: Path = ARCHIVE_DIR) -> Iterator[dict]:
+    """Archived rows of `name` in [since, until), oldest month first, timestamps as datetime."""
+    _, column = TABLES[name]
+    for _, path in _archived_months(name, since, until, archive_dir):
+        yield from _read_month(path, column, since, until, set())
+
+
+def _iter_live(db: Session, lo: Optional[datetime], hi: Optional[datetime],
+               skip: Optional[set[int]] = None) -> Iterator[dict]:
+    table, _ = TABLES["nutrition_records"]
+    q = select(table).order_by(table.c.created_at)
+    if lo:
+        q = q.where(table.c.created_at >= lo)
+    if hi:
+        q = q.where(table.c.created_at < hi)
+    for row in db.execute(q).mappings():
+        if skip and row["id"] in skip:
+            continue
+        yield {k: float(v) if isinstance(v, Decimal) else v for k, v in row.items()}
+
+
+def iter_records(db: Session, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                 archive_dir: Path = ARCHIVE_DIR) -> Iterator[dict]:
+    """nutrition_records in [since, until), archived and live, month by month.
+
+    Live rows are only checked against the archive for months that have an
+    archive file; everything in between streams straight from the table.
+    """
+    _, column = TABLES["nutrition_records"]
+    cursor = since
+    for month, path in _archived_months("nutrition_records", since, until, archive_dir):
+        lo, hi = _midnight(month), _midnight(_add_month(month))
+        if since:
+            lo = max(lo, since)
+        if until:
+            hi = min(hi, until)
+        if cursor is None or cursor < lo:
+            yield from _iter_live(db, cursor, lo)
+        seen: set[int] = set()
+        yield from _read_month(path, column, since, until, seen)
+        yield from _iter_live(db, lo, hi, seen)
+        cursor = hi
+    yield from _iter_live(db, cursor, until)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Archive old nutrition_records/uploads months")
+    ap.add_argument("--keep-months", type=int, default=int(os.getenv("NUTRISNAP_RETENTION_MONTHS", "12")))
+    ap.add_argument("--dir", type=Path, default=ARCHIVE_DIR)
+    ap.add_argument("--months-ahead", type=int, default=MONTHS_AHEAD)
+    ap.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args()
+    run(args.keep_months, args.dir, args.months_ahead, args.dry_run)
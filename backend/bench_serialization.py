@@ -0,0 +1,91 @@
+# backend/bench_serialization.py
+"""Per-row cost of serializing a /history page, before and after FastJSONResponse.
+
+    python -m backend.bench_serialization [--rows 200] [--repeat 200]
+
+"before" replays the old path: ORM Numeric values arrive as Decimal, each row
+becomes a HistoryItem, then FastAPI's response_model validation +
+serialization and JSONResponse run over the list. "after" is the current
+path: float rows from the labelled query, row._asdict() and orjson.
+No database involved; this isolates the Python-side work.
+"""
+from __future__ import annotations
+
+import argparse, asyncio, time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from .main import HISTORY_COLUMNS, HistoryItem
+from .responses import FastJSONResponse, orjson
+
+
+# stands in for the SQLAlchemy Row, which has the same _asdict()
+HistoryRow = namedtuple("HistoryRow", [c.name for c in HISTORY_COLUMNS])  # type: ignore[misc]
+
+
+def _rows(n: int) -> tuple[list[tuple], list[tuple]]:
+    t0 = datetime(2025, 9, 1, 12, 0, 0)
+    orm, projected = [], []
+    for i in range(n):
+        ts = t0 + timedelta(minutes=i)
+        orm.append((i, "pizza", 399, Decimal("16.50"), Decimal("49.50"), Decimal("15.00"),
+                    Decimal("0.8512"), ts, f"meal_{i}.jpg"))
+        projected.append(HistoryRow(i, "pizza", 399, 16.5, 49.5, 15.0, 0.8512, ts, f"meal_{i}.jpg"))
+    return orm, projected
+
+
+def _before(rows: list[tuple], field, loop: asyncio.AbstractEventLoop) -> bytes:
+    items = [
+        HistoryItem(
+            id=r[0], food=r[1], calories=r[2],
+            protein_g=float(r[3]), carbs_g=float(r[4]), fat_g=float(r[5]),
+            confidence=float(r[6]), timestamp=r[7], file_name=r[8],
+        )
+        for r in rows
+    ]
+    content = loop.run_until_complete(
+        serialize_response(field=field, response_content=items, is_coroutine=False)
+    )
+    return JSONResponse(content).body
+
+
+def _after(rows: list[tuple]) -> bytes:
+    return FastJSONResponse([r._asdict() for r in rows]).body
+
+
+def _per_row_us(fn, n_rows: int, repeat: int) -> float:
+    fn()  # warm-up
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / (repeat * n_rows) * 1e6
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rows", type=int, default=200)
+    ap.add_argument("--repeat", type=int, default=200)
+    args = ap.parse_args()
+
+    orm, projected = _rows(args.rows)
+    field = create_model_field("Response_get_history", list[HistoryItem], mode="serialization")
+
+    loop = asyncio.new_event_loop()
+    if _before(orm, field, loop) != _after(projected):
+        raise SystemExit("before/after bodies differ")
+
+    before = _per_row_us(lambda: _before(orm, field, loop), args.rows, args.repeat)
+    after = _per_row_us(lambda: _after(projected), args.rows, args.repeat)
+    print(f"{args.rows} rows x {args.repeat} ({'orjson' if orjson else 'stdlib json'})")
+    print(f"  before: {before:6.2f} us/row")
+    print(f"  after:  {after:6.2f} us/row  ({before / after:.1f}x)")
+    loop.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# backend/inference.py
+"""Inference path: the only module that touches TensorFlow.
+
+Imported lazily by `/analyze`, so workers serving `/history` or `/nutrition`
+never pay for TF/Keras (or NumPy). With NUTRISNAP_MODEL_SERVER set, the model
+lives in the shared model server and this process never imports TF either.
+"""
+from __future__ import annotations
+
+import os, threading
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# TF globals (lazy-loaded)
+TF_MODEL = None
+TF_DECODE = None
+_MODEL_LOCK = threading.Lock()    # one loader, even with several inference threads
+_PREDICT_LOCK = threading.Lock()  # Keras Model.predict is not documented as thread-safe
+
+# Shared model server (see model_server.py); unset = load the model in-process
+MODEL_SERVER_ADDRESS = os.getenv("NUTRISNAP_MODEL_SERVER")
+MODEL_CLIENT = None
+_MODEL_CLIENT_LOCK = threading.Lock()
+
+
+def load_imagenet_model_if_needed():
+    """Lazy-load MobileNetV2(pretrained). First call may download weights."""
+    global TF_MODEL, TF_DECODE
+    if TF_MODEL is not None:
+        return
+    with _MODEL_LOCK:
+        if TF_MODEL is not None:
+            return
+        try:
+            import tensorflow as tf  # type: ignore
+            from tensorflow.keras.applications import mobilenet_v2  # type: ignore
+            model = mobilenet_v2.MobileNetV2(weights="imagenet", include_top=True)
+            decode = mobilenet_v2.decode_predictions
+        except Exception:
+            return
+        # publish the model last: readers check TF_MODEL without the lock
+        TF_DECODE = decode
+        TF_MODEL = model
+
+def _preprocess_image_bytes(image_bytes: bytes) -> np.ndarray:
+    """Same Pillow preprocessing as the model server, so both modes see identical input."""
+    import numpy as np
+    from .model_server import SLOT_SHAPE, preprocess_into
+    x = np.empty((1, *SLOT_SHAPE), dtype=np.float32)
+    preprocess_into(image_bytes, x[0])
+    return x
+
+def _model_client():
+    """Connect this worker to the shared model server once."""
+    global MODEL_CLIENT
+    with _MODEL_CLIENT_LOCK:
+        if MODEL_CLIENT is None or MODEL_CLIENT.closed:
+            from .model_server import ModelClient, parse_address
+            if MODEL_CLIENT is not None:
+                MODEL_CLIENT.close()  # free the dead connection's shared-memory ring
+                MODEL_CLIENT = None
+            MODEL_CLIENT = ModelClient(parse_address(MODEL_SERVER_ADDRESS))  # type: ignore[arg-type]
+    return MODEL_CLIENT
+
+def predict_top5(data: bytes) -> list[tuple[str, str, float]] | None:
+    """ImageNet top-5 as (wnid, class_name, score), or None if no model is available."""
+    if MODEL_SERVER_ADDRESS:
+        try:
+            return _model_client().predict(data, top=5)
+        except Exception:
+            return None
+
+    load_imagenet_model_if_needed()
+    if TF_MODEL is None or TF_DECODE is None:
+        return None
+    try:
+        x = _preprocess_image_bytes(data)
+        with _PREDICT_LOCK:
+            probs = TF_MODEL.predict(x, verbose=0)
+        return TF_DECODE(probs, top=5)[0]
+    except Exception:
+        return None
@@ -1,27 +1,29 @@
 # backend/main.py
 from __future__ import annotations
 
-import io, os, time
+import hashlib, io, math, os, time
 from datetime import datetime
 from typing import Optional
 
-import numpy as np
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Header, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+from sqlalchemy import Float, cast, func
 from sqlalchemy.orm import Session
 from functools import lru_cache
 
 from .db import get_db, SessionLocal
 from .models import Upload, NutritionRecord, ImageNetMap, NutritionInfo
+from .ratelimit import InferenceGate, RateLimiter
+from .responses import FastJSONResponse
 
 # ---------- FastAPI ----------
 app = FastAPI(title="NutriSnap API")
 
-# TF globals (lazy-loaded)
-TF_MODEL = None
-TF_DECODE = None
-IMG_SIZE = 224
+# Read-only replicas: never import TensorFlow, /analyze answers 503
+NO_ML = os.getenv("NUTRISNAP_NO_ML", "").lower() in {"1", "true", "yes"}
+if os.getenv("NUTRISNAP_MODEL_SERVER") and not os.getenv("NUTRISNAP_MODEL_SERVER_KEY"):
+    raise RuntimeError("NUTRISNAP_MODEL_SERVER is set but NUTRISNAP_MODEL_SERVER_KEY is not")
 
 ALLOWED_ORIGINS = ["http://localhost:5173", "https://nutri-snap-iota.vercel.app"] 
 app.add_middleware(
@@ -32,6 +34,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Both revalidate on every use; the ETag turns an unchanged answer into a 304
+NUTRITION_CACHE_CONTROL = "public, no-cache"
+HISTORY_CACHE_CONTROL = "private, no-cache"
+# Backstop for edits the version query cannot see
+NUTRITION_SNAPSHOT_TTL = float(os.getenv("NUTRISNAP_NUTRITION_TTL", "60"))
+
+# /analyze admission: token bucket per client IP, then a global in-flight cap.
+# Rate is tokens per second (0 disables); inference runs on its own threads.
+ANALYZE_LIMITER = RateLimiter(
+    rate=float(os.getenv("NUTRISNAP_ANALYZE_RATE", "0.5")),
+    burst=float(os.getenv("NUTRISNAP_ANALYZE_BURST", "5")),
+)
+INFERENCE_GATE = InferenceGate(
+    max_inflight=int(os.getenv("NUTRISNAP_MAX_INFLIGHT", "2")),
+    max_queued=int(os.getenv("NUTRISNAP_MAX_QUEUED", "8")),
+)
+
 MAX_IMAGE_BYTES = 5 * 1024 * 1024
 ALLOWED_MIME = {"image/jpeg", "image/png", "image/webp"}
 
@@ -68,6 +87,20 @@ class NutritionResponse(BaseModel):
     fat: float
     default_serving_g: int
 
+# /history columns labelled with HistoryItem field names; Numeric → float in SQL
+HISTORY_COLUMNS = (
+    NutritionRecord.id.label("id"),
+    NutritionRecord.food_label.label("food"),
+    NutritionRecord.calories.label("calories"),
+    cast(NutritionRecord.proteins, Float).label("protein_g"),
+    cast(NutritionRecord.carbs, Float).label("carbs_g"),
+    cast(NutritionRecord.fats, Float).label("fat_g"),
+    cast(NutritionRecord.confidence, Float).label("confidence"),
+    NutritionRecord.created_at.label("timestamp"),
+    Upload.file_name.label("file_name"),
+)
+assert {c.name for c in HISTORY_COLUMNS} == set(HistoryItem.model_fields), "HISTORY_COLUMNS out of sync with HistoryItem"
+
 # ---------- Helpers ----------
 def _validate_image(file: UploadFile) -> None:
     if file.content_type not in ALLOWED_MIME:
@@ -77,28 +110,6 @@ def _validate_image(file: UploadFile) -> None:
         raise HTTPException(status_code=413, detail="Image too large (>5MB)")
     file.file = io.BytesIO(data)
 
-def _load_imagenet_model_if_needed():
-    """Lazy-load MobileNetV2(pretrained). First call may download weights."""
-    global TF_MODEL, TF_DECODE
-    if TF_MODEL is not None:
-        return
-    try:
-        import tensorflow as tf  # type: ignore
-        from tensorflow.keras.applications import mobilenet_v2  # type: ignore
-        TF_MODEL = mobilenet_v2.MobileNetV2(weights="imagenet", include_top=True)
-        TF_DECODE = mobilenet_v2.decode_predictions
-        TF_MODEL._ns_preprocess = mobilenet_v2.preprocess_input  # type: ignore[attr-defined]
-    except Exception:
-        TF_MODEL, TF_DECODE = None, None
-
-def _tf_preprocess_image_bytes(image_bytes: bytes) -> np.ndarray:
-    import tensorflow as tf  # type: ignore
-    img = tf.io.decode_image(image_bytes, channels=3, expand_animations=False)
-    img = tf.image.resize(img, [IMG_SIZE, IMG_SIZE])
-    x = tf.cast(img, tf.float32).numpy()
-    x = TF_MODEL._ns_preprocess(x)  # type: ignore[attr-defined]
-    return x[None, ...]
-
 @lru_cache(maxsize=1)
 def _label_map_snapshot(db_hash: int = 0) -> dict[str, str]:
     """Load imagenet→food mapping from DB and cache in memory."""
@@ -111,6 +122,64 @@ def _label_map_snapshot(db_hash: int = 0) -> dict[str, str]:
         s.close()
     return d
 
+def _nutrition_version(db: Session) -> tuple:
+    """Cheap fingerprint of nutrition_info that changes on insert, delete and edit."""
+    return tuple(db.query(
+        func.count(NutritionInfo.id),
+        func.max(NutritionInfo.id),
+        func.sum(func.length(NutritionInfo.food_key)),
+        func.sum(NutritionInfo.calories_per_100g + NutritionInfo.default_serving_g),
+        func.sum(NutritionInfo.protein + NutritionInfo.carbs + NutritionInfo.fat),
+    ).one())
+
+# (table version, built at, ETag, food_key → rendered JSON body)
+_nutrition_cache: Optional[tuple[tuple, float, str, dict[str, bytes]]] = None
+
+def _nutrition_snapshot(db: Session) -> tuple[str, dict[str, bytes]]:
+    """Rendered /nutrition bodies, rebuilt when the table version changes or the TTL lapses.
+
+    The ETag hashes the bodies, so every worker that sees the same table
+    serves the same tag.
+    """
+    global _nutrition_cache
+    version = _nutrition_version(db)
+    cached = _nutrition_cache
+    if cached and cached[0] == version and time.monotonic() - cached[1] < NUTRITION_SNAPSHOT_TTL:
+        return cached[2], cached[3]
+
+    bodies: dict[str, bytes] = {}
+    for info in db.query(NutritionInfo).order_by(NutritionInfo.food_key).all():
+        bodies[info.food_key] = NutritionResponse(  # type: ignore
+            food=info.food_key,  # type: ignore
+            calories_per_100g=info.calories_per_100g,  # type: ignore
+            protein=info.protein,  # type: ignore
+            carbs=info.carbs,  # type: ignore
+            fat=info.fat,  # type: ignore
+            default_serving_g=info.default_serving_g,  # type: ignore
+        ).model_dump_json().encode()
+    digest = hashlib.sha1(b"\n".join(bodies.values())).hexdigest()[:20]
+    etag = f'"n{digest}"'
+    _nutrition_cache = (version, time.monotonic(), etag, bodies)
+    return etag, bodies
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match uses weak comparison, so W/ prefixes are ignored."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+
+def _history_etag(db: Session, user_id: Optional[str], limit: int) -> str:
+    """Tag the history page by its newest record; a new upload changes it."""
+    latest = (
+        db.query(NutritionRecord.id, NutritionRecord.created_at)
+        .order_by(NutritionRecord.id.desc())
+        .first()
+    )
+    key = f"{user_id}|{limit}|" + (f"{latest.id}|{latest.created_at.isoformat()}" if latest else "-")
+    return f'"h{hashlib.sha1(key.encode()).hexdigest()[:20]}"'
+
 def _map_imagenet_label(lbl: str) -> str | None:
     key = lbl.replace(" ", "_").lower()
     return _label_map_snapshot().get(key)
@@ -121,20 +190,15 @@ def _infer_label(image: UploadFile) -> tuple[str, float]:
     data = image.file.read()
     image.file.seek(0)
 
-    _load_imagenet_model_if_needed()
-    if TF_MODEL is not None and TF_DECODE is not None:
-        try:
-            x = _tf_preprocess_image_bytes(data)
-            probs = TF_MODEL.predict(x, verbose=0)
-            decoded = TF_DECODE(probs, top=5)[0]
-            for (_, class_name, score) in decoded:
-                mapped = _map_imagenet_label(class_name)
-                if mapped:
-                    return mapped, float(score)
-            _, class_name, score = decoded[0]
-            return class_name.replace(" ", "_").lower(), float(score)
-        except Exception:
-            pass
+    from .inference import predict_top5  # TF stays out of non-inference paths
+    decoded = predict_top5(data)
+    if decoded:
+        for (_, class_name, score) in decoded:
+            mapped = _map_imagenet_label(class_name)
+            if mapped:
+                return mapped, float(score)
+        _, class_name, score = decoded[0]
+        return class_name.replace(" ", "_").lower(), float(score)
 
     # fallback: filename heuristic
     name = (image.filename or "").lower()
@@ -155,28 +219,14 @@ def _calc_from_db(label: str, db: Session) -> tuple[int, float, float, float, in
     calories = round(cal100 * serving / 100)
     return calories, prot, carbs, fat, serving
 
-# ---------- Routes ----------
-@app.get("/health")
-def health():
-    return {"ok": True}
-
-@app.post("/analyze", response_model=AnalyzeResponse)
-async def analyze_food(
-    image: UploadFile = File(...),
-    user_id: Optional[str] = None,
-    db: Session = Depends(get_db),
-):
-    _validate_image(image)
+def _save_analysis(db: Session, filename: Optional[str], label: str, conf: float, infer_ms: int) -> dict:
+    """Look up nutrition, store the upload + record, and build the /analyze body (blocking DB I/O)."""
+    calories, prot, carbs, fat, serving = _calc_from_db(label, db)
 
-    up = Upload(user_id=None, file_name=image.filename, file_path=None)
+    up = Upload(user_id=None, file_name=filename, file_path=None)
     db.add(up)
     db.flush()
 
-    t0 = time.perf_counter()
-    label, conf = _infer_label(image)
-    calories, prot, carbs, fat, serving = _calc_from_db(label, db)
-    infer_ms = int((time.perf_counter() - t0) * 1000)
-
     rec = NutritionRecord(
         upload_id=up.id,
         food_label=label,
@@ -187,63 +237,101 @@ async def analyze_food(
         fats=fat,
     )
     db.add(rec)
+    upload_id = up.id  # assigned by the flush above; no reload after commit
     db.commit()
-    db.refresh(up)
     db.refresh(rec)
 
-    return AnalyzeResponse(
-        food=label,
-        confidence=float(rec.confidence),
-        serving_g=serving,
-        calories=rec.calories,
-        protein_g=float(rec.proteins),
-        carbs_g=float(rec.carbs),
-        fat_g=float(rec.fats),
-        inference_ms=infer_ms,
-        upload_id=up.id,
-        record_id=rec.id,
-        timestamp=rec.created_at,
-    )
+    return {
+        "food": label,
+        "confidence": float(rec.confidence),
+        "serving_g": serving,
+        "calories": rec.calories,
+        "protein_g": float(rec.proteins),
+        "carbs_g": float(rec.carbs),
+        "fat_g": float(rec.fats),
+        "inference_ms": infer_ms,
+        "upload_id": upload_id,
+        "record_id": rec.id,
+        "timestamp": rec.created_at,
+    }
+
+def _analyze(image: UploadFile) -> dict:
+    """Everything /analyze does once admitted; runs on the inference pool.
+
+    Uses its own session, so the work can outlive a cancelled request.
+    """
+    _validate_image(image)
+    t0 = time.perf_counter()
+    label, conf = _infer_label(image)
+    infer_ms = int((time.perf_counter() - t0) * 1000)
+    db = SessionLocal()
+    try:
+        return _save_analysis(db, image.filename, label, conf, infer_ms)
+    finally:
+        db.close()
+
+# ---------- Routes ----------
+@app.get("/health")
+def health():
+    return {"ok": True}
+
+@app.post("/analyze", response_model=AnalyzeResponse)
+async def analyze_food(
+    request: Request,
+    image: UploadFile = File(...),
+    user_id: Optional[str] = None,
+):
+    if NO_ML:
+        raise HTTPException(status_code=503, detail="Inference disabled on this replica")
+    # user_id is caller-supplied and unauthenticated, so it cannot be the key
+    client_key = request.client.host if request.client else "anonymous"
+    retry_after = await ANALYZE_LIMITER.check(client_key)
+    if retry_after:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+    if not INFERENCE_GATE.try_enter():
+        raise HTTPException(status_code=503, detail="Inference busy", headers={"Retry-After": "1"})
+    # upload read, inference and DB writes all count against the gate,
+    # off the event loop and off the threadpool that serves the read routes
+    body = await INFERENCE_GATE.run(_analyze, image)  # releases the slot when done
+    return FastJSONResponse(body)
 
 @app.get("/history", response_model=list[HistoryItem])
 def get_history(
     user_id: Optional[str] = None,
     limit: int = 50,
+    if_none_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
 ):
-    q = (
-        db.query(NutritionRecord, Upload)
+    limit = min(limit, 200)
+    etag = _history_etag(db, user_id, limit)
+    headers = {"ETag": etag, "Cache-Control": HISTORY_CACHE_CONTROL}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    rows = (
+        db.query(*HISTORY_COLUMNS)
         .join(Upload, NutritionRecord.upload_id == Upload.id)
         .order_by(NutritionRecord.created_at.desc())
-        .limit(min(limit, 200))
+        .limit(limit)
+        .all()
     )
-    items: list[HistoryItem] = []
-    for rec, up in q.all():
-        items.append(
-            HistoryItem(
-                id=rec.id,
-                food=rec.food_label,
-                calories=rec.calories,
-                protein_g=float(rec.proteins),
-                carbs_g=float(rec.carbs),
-                fat_g=float(rec.fats),
-                confidence=float(rec.confidence),
-                timestamp=rec.created_at,
-                file_name=up.file_name,
-            )
-        )
-    return items
+    return FastJSONResponse([row._asdict() for row in rows], headers=headers)
 
 @app.get("/nutrition", response_model=NutritionResponse)
-def get_nutrition(food: str, db: Session = Depends(get_db)):
-    info = db.query(NutritionInfo).filter(NutritionInfo.food_key == food.lower()).first()
-    if not info:
+def get_nutrition(
+    food: str,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
+    etag, bodies = _nutrition_snapshot(db)
+    body = bodies.get(food.lower())
+    if body is None:
         raise HTTPException(status_code=404, detail="Food not found")
-    return NutritionResponse( # type: ignore
-        food=info.food_key,# type: ignore
-        calories_per_100g=info.calories_per_100g,# type: ignore
-        protein=info.protein,# type: ignore
-        carbs=info.carbs,# type: ignore
-        fat=info.fat, # type: ignore
-        default_serving_g=info.default_serving_g,# type: ignore
-    )
+    headers = {"ETag": etag, "Cache-Control": NUTRITION_CACHE_CONTROL}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
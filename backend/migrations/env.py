@@ -1,8 +1,9 @@
 # backend/migrations/env.py
 from pathlib import Path
-import sys, os
+import re, sys, os
 from alembic import context
 from sqlalchemy import engine_from_config, pool
+from sqlalchemy.engine import make_url
 from dotenv import load_dotenv
 
 from backend import models  # noqa: F401     # ensure metadata is loaded
@@ -21,15 +22,45 @@ cfg["sqlalchemy.url"] = os.getenv("DATABASE_URL") or "sqlite:///./nutrisnap.db"
 target_metadata = models.Base.metadata
 
 
+# monthly/default partitions created by migrations and backend/archive.py
+PARTITION_TABLE = re.compile(r"^(uploads|nutrition_records)_(p\d{4}_\d{2}|default)$")
+
+
+def include_object_for(dialect: str):
+    """Skip schema objects that intentionally differ from the models on `dialect`."""
+    def include_object(obj, name, type_, reflected, compare_to):
+        if dialect != "postgresql":
+            return True
+        # partitions are managed outside the models
+        if type_ == "table" and PARTITION_TABLE.match(name):
+            return False
+        if type_ == "index" and PARTITION_TABLE.match(obj.table.name):
+            return False
+        # uploads is partitioned, so nutrition_records.upload_id has no DB-level FK
+        if (type_ == "foreign_key_constraint"
+                and obj.table.name == "nutrition_records"
+                and obj.referred_table.name == "uploads"):
+            return False
+        return True
+    return include_object
+
+
 def run_migrations_offline() -> None:
-    context.configure(url=cfg["sqlalchemy.url"], target_metadata=target_metadata, literal_binds=True)
+    url = cfg["sqlalchemy.url"]
+    context.configure(
+        url=url, target_metadata=target_metadata, literal_binds=True,
+        include_object=include_object_for(make_url(url).get_backend_name()),
+    )
     with context.begin_transaction():
         context.run_migrations()
 
 def run_migrations_online() -> None:
     connectable = engine_from_config(cfg, prefix="sqlalchemy.", poolclass=pool.NullPool)
     with connectable.connect() as connection:
-        context.configure(connection=connection, target_metadata=target_metadata)
+        context.configure(
+            connection=connection, target_metadata=target_metadata,
+            include_object=include_object_for(connection.dialect.name),
+        )
         with context.begin_transaction():
             context.run_migrations()
 
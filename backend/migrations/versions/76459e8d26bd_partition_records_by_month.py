@@ -0,0 +1,118 @@
+"""partition nutrition_records and uploads by month
+
+Revision ID: 76459e8d26bd
+Revises: d14d27c8645b
+Create Date: 2025-09-14 10:12:31.508214
+
+On Postgres both tables become RANGE-partitioned parents with one partition
+per calendar month (plus a DEFAULT partition); `python -m backend.archive`
+keeps future months created and moves old ones out to compressed NDJSON.
+The primary keys become (id, <timestamp>) as Postgres requires, which means
+nutrition_records.upload_id can no longer be a database-level foreign key
+(the ORM relationship and cascade are unchanged).
+
+SQLite has no partitioning: it only gets the timestamp and upload_id indexes,
+and the archive job works on row ranges instead of partitions.
+"""
+from datetime import date, datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '76459e8d26bd'
+down_revision: Union[str, Sequence[str], None] = 'd14d27c8645b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MONTHS_AHEAD = 3
+
+# table -> (partition column, column DDL without the primary key)
+_TABLES = {
+    "uploads": ("uploaded_at", """
+        id integer NOT NULL DEFAULT nextval('uploads_id_seq'::regclass),
+        user_id integer REFERENCES users (id) ON DELETE CASCADE,
+        file_name varchar(255),
+        file_path text,
+        uploaded_at timestamp NOT NULL DEFAULT now()"""),
+    "nutrition_records": ("created_at", """
+        id integer NOT NULL DEFAULT nextval('nutrition_records_id_seq'::regclass),
+        upload_id integer NOT NULL,
+        food_label varchar(100) NOT NULL,
+        confidence numeric(5, 4) NOT NULL,
+        calories integer NOT NULL,
+        proteins numeric(6, 2) NOT NULL,
+        carbs numeric(6, 2) NOT NULL,
+        fats numeric(6, 2) NOT NULL,
+        created_at timestamp NOT NULL DEFAULT now()"""),
+}
+_COPY_COLUMNS = {
+    "uploads": "id, user_id, file_name, file_path, uploaded_at",
+    "nutrition_records": "id, upload_id, food_label, confidence, calories, proteins, carbs, fats, created_at",
+}
+
+
+def _add_month(d: date, n: int = 1) -> date:
+    y, m = divmod(d.month - 1 + n, 12)
+    return date(d.year + y, m + 1, 1)
+
+
+def _rebuild(table: str, old: str, *, partitioned: bool) -> None:
+    """Recreate `table` (optionally partitioned), copy rows over from `old`, drop `old`."""
+    bind = op.get_bind()
+    column, ddl = _TABLES[table]
+    op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY NONE")
+    op.execute(f"ALTER TABLE {table} RENAME TO {old}")
+    op.execute(f"ALTER TABLE {old} RENAME CONSTRAINT {table}_pkey TO {old}_pkey")
+
+    if partitioned:
+        op.execute(
+            f"CREATE TABLE {table} ({ddl},\n PRIMARY KEY (id, {column}))"
+            f" PARTITION BY RANGE ({column})"
+        )
+        lo = bind.execute(sa.text(f"SELECT min({column}) FROM {old}")).scalar()
+        month = (lo or datetime.now()).date().replace(day=1)
+        last = _add_month(date.today().replace(day=1), MONTHS_AHEAD)
+        while month <= last:
+            nxt = _add_month(month)
+            op.execute(
+                f"CREATE TABLE {table}_p{month:%Y_%m} PARTITION OF {table}"
+                f" FOR VALUES FROM ('{month}') TO ('{nxt}')"
+            )
+            month = nxt
+        op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+    else:
+        op.execute(f"CREATE TABLE {table} ({ddl},\n PRIMARY KEY (id))")
+
+    cols = _COPY_COLUMNS[table]
+    op.execute(f"INSERT INTO {table} ({cols}) SELECT {cols} FROM {old}")
+    op.execute(f"DROP TABLE {old} CASCADE")
+    op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name == "postgresql":
+        op.drop_constraint('nutrition_records_upload_id_fkey', 'nutrition_records', type_='foreignkey')
+        _rebuild("uploads", "uploads_legacy", partitioned=True)
+        _rebuild("nutrition_records", "nutrition_records_legacy", partitioned=True)
+    op.create_index(op.f('ix_nutrition_records_upload_id'), 'nutrition_records', ['upload_id'], unique=False)
+    op.create_index(op.f('ix_nutrition_records_created_at'), 'nutrition_records', ['created_at'], unique=False)
+    op.create_index(op.f('ix_uploads_uploaded_at'), 'uploads', ['uploaded_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_uploads_uploaded_at'), table_name='uploads')
+    op.drop_index(op.f('ix_nutrition_records_created_at'), table_name='nutrition_records')
+    op.drop_index(op.f('ix_nutrition_records_upload_id'), table_name='nutrition_records')
+    if op.get_bind().dialect.name == "postgresql":
+        _rebuild("nutrition_records", "nutrition_records_partitioned", partitioned=False)
+        _rebuild("uploads", "uploads_partitioned", partitioned=False)
+        # NOT VALID: records whose uploads were already archived stay put
+        op.execute(
+            "ALTER TABLE nutrition_records ADD CONSTRAINT nutrition_records_upload_id_fkey"
+            " FOREIGN KEY (upload_id) REFERENCES uploads (id) ON DELETE CASCADE NOT VALID"
+        )
@@ -0,0 +1,328 @@
+# backend/model_server.py
+"""Shared MobileNetV2 server for multi-worker deployments.
+
+One process holds the TF runtime and weights; every uvicorn worker talks to it
+through a `ModelClient`. Each client owns a ring of float32 224x224x3 slots in
+`multiprocessing.shared_memory`; only the slot index travels over the socket,
+so image tensors are never pickled. The server drains requests from all
+workers and runs them through the model in batches.
+
+    export NUTRISNAP_MODEL_SERVER_KEY=$(python -c "import secrets; print(secrets.token_hex(32))")
+    python -m backend.model_server
+    NUTRISNAP_MODEL_SERVER=/tmp/nutrisnap-model.sock uvicorn backend.main:app --workers 4
+
+`multiprocessing.connection` unpickles what it receives, so anyone who can
+reach the listener and knows the key can run code in the server. There is no
+default key, and the default address is a unix socket readable only by its
+owner (0600).
+"""
+from __future__ import annotations
+
+import argparse, atexit, io, os, queue, threading, time
+from multiprocessing import AuthenticationError, resource_tracker, shared_memory
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Any, Optional, Union
+
+import numpy as np
+
+IMG_SIZE = 224
+SLOT_SHAPE = (IMG_SIZE, IMG_SIZE, 3)
+SLOT_BYTES = IMG_SIZE * IMG_SIZE * 3 * np.dtype(np.float32).itemsize
+
+RING_SLOTS = int(os.getenv("NUTRISNAP_RING_SLOTS", "8"))
+MAX_BATCH = int(os.getenv("NUTRISNAP_MAX_BATCH", "16"))
+BATCH_WAIT_MS = float(os.getenv("NUTRISNAP_BATCH_WAIT_MS", "5"))
+DEFAULT_ADDRESS = "/tmp/nutrisnap-model.sock"
+
+# limits on what a client may ask for
+MAX_RING_SLOTS = 256
+NUM_CLASSES = 1000  # ImageNet; bounds `top`
+
+Address = Union[str, tuple[str, int]]
+Prediction = list[tuple[str, str, float]]  # decode_predictions rows: (wnid, name, score)
+
+
+def parse_address(addr: str) -> Address:
+    """'host:port' -> TCP tuple, anything else is a unix socket path."""
+    host, sep, port = addr.rpartition(":")
+    if sep and port.isdigit():
+        return (host or "127.0.0.1", int(port))
+    return addr
+
+
+def authkey() -> bytes:
+    """Shared secret for the connection handshake; refuses to run without one."""
+    key = os.getenv("NUTRISNAP_MODEL_SERVER_KEY")
+    if not key:
+        raise RuntimeError("NUTRISNAP_MODEL_SERVER_KEY must be set to use the model server")
+    return key.encode()
+
+
+def _listen(address: Address, key: bytes) -> Listener:
+    """Bind the listener; unix sockets are created owner-only (0600)."""
+    if isinstance(address, tuple):
+        return Listener(address, authkey=key)
+    if os.path.exists(address):
+        os.unlink(address)  # stale socket from a previous run
+    old_umask = os.umask(0o177)
+    try:
+        return Listener(address, family="AF_UNIX", authkey=key)
+    finally:
+        os.umask(old_umask)
+
+
+def preprocess_into(image_bytes: bytes, out: np.ndarray) -> None:
+    """Decode + resize with Pillow and apply MobileNetV2 scaling ([-1, 1]) in place.
+
+    This is the only preprocessing path: the in-process model in inference.py
+    uses it too, so a given image gets the same tensor in both deployment
+    modes. Pillow's bilinear filter (antialiased when downscaling) is what
+    Keras' own image loaders use, and it keeps TensorFlow out of the HTTP
+    workers. `out` is usually a ring slot.
+    """
+    from PIL import Image
+
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        img = img.convert("RGB").resize((IMG_SIZE, IMG_SIZE), Image.BILINEAR)
+        np.divide(np.asarray(img, dtype=np.float32), 127.5, out=out)
+    out -= 1.0
+
+
+# ---------- Worker side ----------
+class ModelClient:
+    """Per-process connection to the model server backed by a shared-memory ring."""
+
+    def __init__(self, address: Address, slots: int = RING_SLOTS):
+        self._conn = Client(address, authkey=authkey())
+        self._shm = shared_memory.SharedMemory(create=True, size=slots * SLOT_BYTES)
+        self._ring: Optional[np.ndarray] = np.ndarray(
+            (slots, *SLOT_SHAPE), dtype=np.float32, buffer=self._shm.buf
+        )
+        self._free: queue.Queue[int] = queue.Queue()
+        for i in range(slots):
+            self._free.put(i)
+        self._pending: dict[int, tuple[threading.Event, list[Any]]] = {}
+        self._abandoned: set[int] = set()
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self._conn.send(("attach", self._shm.name, slots))
+        threading.Thread(target=self._read_loop, name="model-client", daemon=True).start()
+        atexit.register(self.close)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def predict(self, image_bytes: bytes, top: int = 5, timeout: float = 30.0) -> Prediction:
+        if self._closed:
+            raise ConnectionError("model server connection closed")
+        slot = self._free.get(timeout=timeout)
+        done, box = threading.Event(), []
+        try:
+            preprocess_into(image_bytes, self._ring[slot])  # type: ignore[index]
+            with self._lock:
+                self._pending[slot] = (done, box)
+                self._conn.send((slot, top))
+        except BaseException as e:
+            with self._lock:
+                self._pending.pop(slot, None)
+            self._free.put(slot)
+            if isinstance(e, OSError):
+                self._closed = True  # let the owner reconnect on the next call
+            raise
+
+        if not done.wait(timeout):
+            # the server may still read this slot; recycle it when the late reply lands
+            with self._lock:
+                late = self._pending.pop(slot, None) is not None
+                if late:
+                    self._abandoned.add(slot)
+            if late:
+                raise TimeoutError("model server did not answer in time")
+        self._free.put(slot)
+
+        ok, payload = box[0]
+        if not ok:
+            raise RuntimeError(f"model server error: {payload}")
+        return payload
+
+    def _read_loop(self) -> None:
+        try:
+            while True:
+                slot, ok, payload = self._conn.recv()
+                with self._lock:
+                    waiter = self._pending.pop(slot, None)
+                    if waiter is None and slot in self._abandoned:
+                        self._abandoned.discard(slot)
+                        self._free.put(slot)
+                if waiter is not None:
+                    waiter[1].append((ok, payload))
+                    waiter[0].set()
+        except (EOFError, OSError):
+            pass
+        self._closed = True
+        with self._lock:
+            waiters, self._pending = list(self._pending.values()), {}
+        for done, box in waiters:
+            box.append((False, "connection lost"))
+            done.set()
+
+    def close(self) -> None:
+        if self._ring is None:
+            return
+        atexit.unregister(self.close)
+        self._closed = True
+        try:
+            self._conn.close()
+        except OSError:
+            pass
+        self._ring = None
+        try:
+            self._shm.close()
+        except BufferError:
+            pass  # a predict() still holds a slot view; the mapping goes with it
+        try:
+            self._shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+# ---------- Server side ----------
+class _Peer:
+    """One attached worker: its connection and a view over its ring."""
+
+    def __init__(self, conn: Connection, shm_name: str, slots: int):
+        self.conn = conn
+        self.slots = slots
+        self.shm = shared_memory.SharedMemory(name=shm_name)
+        # the worker owns the segment; stop our tracker from unlinking it on exit
+        resource_tracker.unregister(self.shm._name, "shared_memory")  # type: ignore[attr-defined]
+        try:
+            self.ring: Optional[np.ndarray] = np.ndarray(
+                (slots, *SLOT_SHAPE), dtype=np.float32, buffer=self.shm.buf
+            )
+        except TypeError:  # segment smaller than the ring it claims to hold
+            self.shm.close()
+            raise
+        self.closed = False
+        self._send_lock = threading.Lock()  # replies come from the peer and batch threads
+
+    def reply(self, slot: int, ok: bool, payload: Any) -> None:
+        if self.closed:
+            return
+        try:
+            with self._send_lock:
+                self.conn.send((slot, ok, payload))
+        except OSError:
+            self.closed = True
+
+    def release(self) -> None:
+        self.ring = None
+        self.shm.close()
+        self.conn.close()
+
+
+def _load_model():
+    import tensorflow as tf  # type: ignore  # noqa: F401
+    from tensorflow.keras.applications import mobilenet_v2  # type: ignore
+
+    model = mobilenet_v2.MobileNetV2(weights="imagenet", include_top=True)
+    return model, mobilenet_v2.decode_predictions
+
+
+def _attach(conn: Connection) -> Optional[_Peer]:
+    """Handshake ("attach", shm_name, slots); a malformed one closes the connection."""
+    try:
+        kind, shm_name, slots = conn.recv()
+        if (kind == "attach" and isinstance(shm_name, str)
+                and isinstance(slots, int) and 0 < slots <= MAX_RING_SLOTS):
+            return _Peer(conn, shm_name, slots)
+    except (EOFError, OSError, TypeError, ValueError):
+        pass
+    conn.close()
+    return None
+
+
+def _serve_peer(conn: Connection, jobs: queue.Queue) -> None:
+    peer = _attach(conn)
+    if peer is None:
+        return
+    try:
+        while True:
+            slot, top = conn.recv()
+            # only in-range work reaches the batch; a bad request fails alone
+            if not (isinstance(slot, int) and 0 <= slot < peer.slots):
+                peer.reply(slot, False, "slot out of range")
+            elif not (isinstance(top, int) and 0 < top <= NUM_CLASSES):
+                peer.reply(slot, False, "top out of range")
+            else:
+                jobs.put((peer, slot, top))
+    except (EOFError, OSError, TypeError, ValueError):
+        pass  # disconnected, or a message that is not (slot, top)
+    peer.closed = True
+    jobs.put((peer, -1, 0))  # ring is released on the batching thread, the only reader
+
+
+def _accept_loop(listener: Listener, jobs: queue.Queue) -> None:
+    while True:
+        try:
+            conn = listener.accept()
+        except (AuthenticationError, EOFError, OSError):
+            continue  # bad authkey / aborted handshake
+        threading.Thread(target=_serve_peer, args=(conn, jobs), daemon=True).start()
+
+
+def _batch_loop(model, decode, jobs: queue.Queue) -> None:
+    wait_s = BATCH_WAIT_MS / 1000
+    while True:
+        batch = [jobs.get()]
+        deadline = time.perf_counter() + wait_s
+        while len(batch) < MAX_BATCH:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(jobs.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        work = [(p, s, t) for p, s, t in batch if s >= 0 and not p.closed]
+        if work:
+            try:
+                x = np.stack([p.ring[s] for p, s, _ in work])  # type: ignore[index]
+                probs = model.predict_on_batch(x)
+            except Exception as e:
+                for peer, slot, _ in work:
+                    peer.reply(slot, False, repr(e))
+            else:
+                for i, (peer, slot, top) in enumerate(work):
+                    try:
+                        decoded = decode(probs[i : i + 1], top=top)[0]
+                    except Exception as e:
+                        peer.reply(slot, False, repr(e))
+                        continue
+                    peer.reply(slot, True, [(w, n, float(sc)) for w, n, sc in decoded])
+
+        for peer, slot, _ in batch:
+            if slot < 0:
+                peer.release()
+
+
+def serve(address: Address) -> None:
+    key = authkey()
+    model, decode = _load_model()
+    jobs: queue.Queue = queue.Queue()
+    listener = _listen(address, key)
+    threading.Thread(target=_accept_loop, args=(listener, jobs), daemon=True).start()
+    print(f"Model server listening on {address} (max batch {MAX_BATCH}, wait {BATCH_WAIT_MS}ms)")
+    try:
+        _batch_loop(model, decode, jobs)
+    finally:
+        listener.close()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="NutriSnap shared model server")
+    ap.add_argument("--address", default=os.getenv("NUTRISNAP_MODEL_SERVER", DEFAULT_ADDRESS))
+    serve(parse_address(ap.parse_args().address))
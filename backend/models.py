@@ -36,7 +36,7 @@ class Upload(Base):
     )
     file_name: Mapped[Optional[str]] = mapped_column(String(255))
     file_path: Mapped[Optional[str]] = mapped_column(Text)
-    uploaded_at: Mapped[datetime] = mapped_column(TIMESTAMP, server_default=func.now())
+    uploaded_at: Mapped[datetime] = mapped_column(TIMESTAMP, server_default=func.now(), index=True)
 
     user: Mapped[Optional["User"]] = relationship(back_populates="uploads")
     nutrition: Mapped[list["NutritionRecord"]] = relationship(
@@ -48,8 +48,10 @@ class NutritionRecord(Base):
     __tablename__ = "nutrition_records"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    # Postgres: ORM-only link, the partitioned uploads table can't be an FK target
+    # (migrations/env.py keeps autogenerate from re-adding it)
     upload_id: Mapped[int] = mapped_column(
-        ForeignKey("uploads.id", ondelete="CASCADE")
+        ForeignKey("uploads.id", ondelete="CASCADE"), index=True
     )
     food_label: Mapped[str] = mapped_column(String(100))
     confidence: Mapped[float] = mapped_column(Numeric(5, 4))  # 0.0000–9.9999
@@ -57,7 +59,8 @@ class NutritionRecord(Base):
     proteins: Mapped[float] = mapped_column(Numeric(6, 2))
     carbs: Mapped[float] = mapped_column(Numeric(6, 2))
     fats: Mapped[float] = mapped_column(Numeric(6, 2))
-    created_at: Mapped[datetime] = mapped_column(TIMESTAMP, server_default=func.now())
+    # Postgres: partitioned by month on this column (see backend/archive.py)
+    created_at: Mapped[datetime] = mapped_column(TIMESTAMP, server_default=func.now(), index=True)
 
     upload: Mapped["Upload"] = relationship(back_populates="nutrition")
 
@@ -0,0 +1,115 @@
+# backend/ratelimit.py
+"""Per-client rate limiting and admission control for /analyze.
+
+`RateLimiter` is a token bucket per key (the client IP). Buckets live in a
+`BucketStore`; the default keeps them in process, and anything with the
+same awaitable `take()` (a shared cache, or a stand-in in tests) can be
+swapped in without blocking the event loop.
+
+`InferenceGate` caps how many inferences are admitted at once and runs them
+on a dedicated thread pool, so model work never occupies the event loop or
+the threadpool that serves /health, /nutrition and /history.
+"""
+from __future__ import annotations
+
+import asyncio, threading, time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Protocol, TypeVar
+
+T = TypeVar("T")
+
+
+class BucketStore(Protocol):
+    async def take(self, key: str, rate: float, burst: float, now: float) -> float:
+        """Spend one token from `key`'s bucket: 0.0 if allowed, else seconds until one refills."""
+        ...
+
+
+class MemoryBucketStore:
+    """In-process buckets: key -> (tokens, last refill time), least recently used first.
+
+    Holds at most `max_keys` buckets; the least recently seen key is evicted,
+    which at worst hands that client a fresh burst.
+    """
+
+    def __init__(self, max_keys: int = 10_000):
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_keys = max_keys
+
+    async def take(self, key: str, rate: float, burst: float, now: float) -> float:
+        with self._lock:  # held for a few dict operations, never across an await
+            tokens, last = self._buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - last) * rate)
+            if tokens >= 1.0:
+                self._buckets[key] = (tokens - 1.0, now)
+                wait = 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                wait = (1.0 - tokens) / rate
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+
+class RateLimiter:
+    def __init__(self, rate: float, burst: float, store: Optional[BucketStore] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.store: BucketStore = store or MemoryBucketStore()
+        self.clock = clock
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    async def check(self, key: str) -> float:
+        """0.0 if `key` may proceed, else the Retry-After in seconds."""
+        if not self.enabled:
+            return 0.0
+        return await self.store.take(key, self.rate, self.burst, self.clock())
+
+
+class InferenceGate:
+    """At most `max_inflight` running and `max_queued` waiting inferences."""
+
+    def __init__(self, max_inflight: int, max_queued: int):
+        if max_inflight < 1 or max_queued < 0:
+            raise ValueError(f"need max_inflight >= 1 and max_queued >= 0, got {max_inflight} and {max_queued}")
+        self.max_inflight = max_inflight
+        self.limit = max_inflight + max_queued
+        self._admitted = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_inflight, thread_name_prefix="inference")
+
+    @property
+    def admitted(self) -> int:
+        return self._admitted
+
+    def try_enter(self) -> bool:
+        with self._lock:
+            if self._admitted >= self.limit:
+                return False
+            self._admitted += 1
+            return True
+
+    def leave(self) -> None:
+        with self._lock:
+            self._admitted -= 1
+
+    async def run(self, fn: Callable[..., T], *args) -> T:
+        """Run `fn` for a caller that got in via `try_enter()`.
+
+        The slot is released when the job itself finishes (or is cancelled
+        before it starts), not when the caller stops waiting, so a cancelled
+        request cannot leave untracked work in the pool.
+        """
+        try:
+            fut = self._executor.submit(fn, *args)
+        except BaseException:
+            self.leave()
+            raise
+        fut.add_done_callback(lambda _: self.leave())
+        return await asyncio.wrap_future(fut)
@@ -0,0 +1,108 @@
+# backend/startup_report.py
+"""Cold-start report for the API process.
+
+    python -m backend.startup_report [--top 15]
+
+Imports `backend.main` in fresh interpreters: one under `-X importtime` to get
+per-module import cost, one that times the import and a first GET /health
+served straight through the ASGI app (no server, no sockets).
+
+NUTRISNAP_NO_ML only changes what /analyze does at request time, so it makes no
+difference here: TensorFlow is never imported at startup either way.
+"""
+from __future__ import annotations
+
+import argparse, json, os, subprocess, sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+_FIRST_RESPONSE = r"""
+import asyncio, json, time
+t0 = time.perf_counter()
+from backend.main import app
+t_import = time.perf_counter()
+
+async def first_response():
+    sent = []
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+    async def send(msg):
+        sent.append(msg)
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+             "method": "GET", "scheme": "http", "path": "/health", "raw_path": b"/health",
+             "root_path": "", "query_string": b"", "headers": [],
+             "client": ("127.0.0.1", 0), "server": ("127.0.0.1", 8000)}
+    await app(scope, receive, send)
+    return sent[0]["status"]
+
+status = asyncio.run(first_response())
+t_first = time.perf_counter()
+import sys
+print(json.dumps({
+    "import_ms": (t_import - t0) * 1000,
+    "first_response_ms": (t_first - t0) * 1000,
+    "status": status,
+    "tensorflow_loaded": "tensorflow" in sys.modules,
+    "numpy_loaded": "numpy" in sys.modules,
+}))
+"""
+
+
+def _run(args: list[str], env: dict[str, str]) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *args], cwd=ROOT, env=env, capture_output=True, text=True
+    )
+
+
+def import_times(env: dict[str, str]) -> list[tuple[int, int, str]]:
+    """(self_us, cumulative_us, module) for every module `backend.main` pulls in.
+
+    Module names keep `-X importtime`'s indentation, which encodes nesting.
+    """
+    proc = _run(["-X", "importtime", "-c", "import backend.main"], env)
+    if proc.returncode != 0:
+        sys.exit(proc.stderr)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cum_us, name = line.split(":", 1)[1].split("|")
+        rows.append((int(self_us), int(cum_us), name[1:].rstrip()))
+    return rows
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--top", type=int, default=15, help="how many modules/packages to list")
+    args = ap.parse_args()
+
+    env = dict(os.environ)
+    rows = import_times(env)
+    # cumulative time includes everything a module imported, so parents rank above their children
+    print(f"Top {args.top} modules by cumulative import time:")
+    for self_us, cum_us, name in sorted(rows, key=lambda r: -r[1])[: args.top]:
+        print(f"  {cum_us / 1000:9.1f} ms  (self {self_us / 1000:7.1f} ms)  {name.strip()}")
+    print()
+    by_package: dict[str, list[int]] = {}
+    for self_us, _, name in rows:
+        agg = by_package.setdefault(name.strip().split(".")[0], [0, 0])
+        agg[0] += self_us
+        agg[1] += 1
+    print(f"Top {args.top} packages by self import time (sum over their modules):")
+    for pkg, (us, n) in sorted(by_package.items(), key=lambda kv: -kv[1][0])[: args.top]:
+        print(f"  {us / 1000:9.1f} ms  {n:4d} modules  {pkg}")
+    print(f"  {len(rows)} modules, {sum(r[0] for r in rows) / 1000:.1f} ms total")
+
+    proc = _run(["-c", _FIRST_RESPONSE], env)
+    if proc.returncode != 0:
+        sys.exit(proc.stderr)
+    report = json.loads(proc.stdout.strip().splitlines()[-1])
+    print(f"import backend.main: {report['import_ms']:.1f} ms")
+    print(f"first GET /health:   {report['first_response_ms']:.1f} ms (status {report['status']})")
+    print(f"tensorflow loaded:   {report['tensorflow_loaded']}")
+    print(f"numpy loaded:        {report['numpy_loaded']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# backend.db binds its engine at import; point it at a throwaway SQLite file
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/nutrisnap-test.db"
@@ -0,0 +1,66 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from backend import archive
+from backend.db import Base
+from backend.models import NutritionRecord, Upload
+
+MARCH, APRIL, MAY = datetime(2024, 3, 10), datetime(2024, 4, 10), datetime(2024, 5, 10)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'archive.db'}")
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        up = Upload(file_name="meal.jpg", uploaded_at=MARCH)
+        db.add(up)
+        db.flush()
+        for i, ts in enumerate([MARCH, MARCH, APRIL, MAY]):
+            db.add(NutritionRecord(upload_id=up.id, food_label=f"food{i}", confidence=0.9,
+                                   calories=100, proteins=1.5, carbs=2.0, fats=0.5, created_at=ts))
+        db.commit()
+    return engine
+
+
+def _ids(engine, tmp_path, **kw):
+    with Session(engine) as db:
+        return [r["id"] for r in archive.iter_records(db, archive_dir=tmp_path, **kw)]
+
+
+def test_archive_month_moves_rows_to_file(engine, tmp_path):
+    with engine.begin() as conn:
+        assert archive.archive_month(conn, "nutrition_records", MARCH.date().replace(day=1), tmp_path) == 2
+        assert archive.archive_month(conn, "nutrition_records", MAY.date().replace(day=1), tmp_path) == 1
+        live = conn.execute(select(NutritionRecord.id)).scalars().all()
+
+    assert live == [3]
+    archived = list(archive.iter_archived("nutrition_records", archive_dir=tmp_path))
+    assert [r["id"] for r in archived] == [1, 2, 4]
+    assert archived[0]["created_at"] == MARCH
+    assert _ids(engine, tmp_path) == [1, 2, 3, 4]
+    assert _ids(engine, tmp_path, since=APRIL, until=MAY) == [3]
+    assert _ids(engine, tmp_path, since=MARCH, until=APRIL) == [1, 2]
+
+
+def test_rerun_after_crash_yields_each_record_once(engine, tmp_path):
+    march = MARCH.date().replace(day=1)
+    with engine.connect() as conn:  # file written, delete rolled back
+        with conn.begin() as tx:
+            archive.archive_month(conn, "nutrition_records", march, tmp_path)
+            tx.rollback()
+    assert _ids(engine, tmp_path) == [1, 2, 3, 4]
+
+    with engine.begin() as conn:  # the rerun appends March again
+        archive.archive_month(conn, "nutrition_records", march, tmp_path)
+    assert [r["id"] for r in archive.iter_archived("nutrition_records", archive_dir=tmp_path)] == [1, 2]
+    assert _ids(engine, tmp_path) == [1, 2, 3, 4]
+
+
+def test_empty_month_is_a_no_op(engine, tmp_path):
+    with engine.begin() as conn:
+        assert archive.archive_month(conn, "nutrition_records", datetime(2024, 1, 1).date(), tmp_path) == 0
+    assert not (tmp_path / "nutrition_records").exists()
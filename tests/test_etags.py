@@ -0,0 +1,61 @@
+import io
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from backend import main, seed_imagenet_map, seed_nutrition_info
+from backend.main import _etag_matches
+
+
+@pytest.fixture(scope="module")
+def client():
+    seed_nutrition_info.run()
+    seed_imagenet_map.run()
+    return TestClient(main.app)
+
+
+def _png() -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (8, 8)).save(buf, "PNG")
+    return buf.getvalue()
+
+
+@pytest.mark.parametrize("header,expected", [
+    (None, False),
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"x", W/"abc" , "y"', True),
+    ("*", True),
+    ('"abd"', False),
+    ('"x", "y"', False),
+])
+def test_etag_matches(header, expected):
+    assert _etag_matches(header, '"abc"') is expected
+
+
+def test_nutrition_304(client):
+    r = client.get("/nutrition", params={"food": "pizza"})
+    assert r.status_code == 200 and r.json()["food"] == "pizza"
+    etag = r.headers["etag"]
+
+    r = client.get("/nutrition", params={"food": "pizza"}, headers={"If-None-Match": f"W/{etag}"})
+    assert r.status_code == 304 and r.content == b""
+    assert r.headers["etag"] == etag
+    assert client.get("/nutrition", params={"food": "nope"}, headers={"If-None-Match": etag}).status_code == 404
+
+
+def test_history_etag_changes_after_analyze(client, monkeypatch):
+    r = client.get("/history")
+    etag = r.headers["etag"]
+    assert client.get("/history", headers={"If-None-Match": etag}).status_code == 304
+
+    monkeypatch.setattr(main, "_infer_label", lambda image: ("banana", 0.9))
+    created = client.post("/analyze", files={"image": ("meal.png", _png(), "image/png")})
+    assert created.status_code == 200
+
+    r = client.get("/history", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["etag"] != etag
+    assert r.json()[0]["id"] == created.json()["record_id"]
+    assert client.get("/history", headers={"If-None-Match": r.headers["etag"]}).status_code == 304
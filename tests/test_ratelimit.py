@@ -0,0 +1,92 @@
+import asyncio
+import threading
+
+import pytest
+
+from backend.ratelimit import InferenceGate, MemoryBucketStore, RateLimiter
+
+
+class StandInStore:
+    """Records calls and answers from a script, like a shared cache would."""
+
+    def __init__(self, waits):
+        self.waits = list(waits)
+        self.calls = []
+
+    async def take(self, key, rate, burst, now):
+        await asyncio.sleep(0)  # a real shared store would await network I/O here
+        self.calls.append((key, rate, burst, now))
+        return self.waits.pop(0)
+
+
+def test_limiter_awaits_store_with_clock():
+    store = StandInStore([0.0, 1.5])
+    limiter = RateLimiter(rate=2, burst=3, store=store, clock=lambda: 42.0)
+
+    assert asyncio.run(limiter.check("10.0.0.1")) == 0.0
+    assert asyncio.run(limiter.check("10.0.0.1")) == 1.5
+    assert store.calls == [("10.0.0.1", 2, 3, 42.0)] * 2
+
+
+def test_disabled_limiter_skips_store():
+    store = StandInStore([])
+    assert asyncio.run(RateLimiter(rate=0, burst=3, store=store).check("k")) == 0.0
+    assert store.calls == []
+
+
+def test_memory_store_refills_and_reports_wait():
+    now = [0.0]
+    limiter = RateLimiter(rate=0.5, burst=2, clock=lambda: now[0])
+    check = lambda: asyncio.run(limiter.check("k"))
+
+    assert [check(), check()] == [0.0, 0.0]
+    assert check() == 2.0  # one token refills after 1 / 0.5 seconds
+    now[0] = 2.0
+    assert check() == 0.0
+
+
+def test_memory_store_evicts_least_recently_used():
+    store = MemoryBucketStore(max_keys=2)
+    take = lambda key: asyncio.run(store.take(key, 1.0, 1.0, 0.0))
+
+    take("a"), take("b"), take("a"), take("c")  # "b" is now the oldest
+    assert take("a") > 0  # still tracked, bucket empty
+    assert take("b") == 0.0  # was evicted, starts with a full bucket
+
+
+def test_gate_rejects_past_limit():
+    gate = InferenceGate(max_inflight=1, max_queued=1)
+    assert gate.try_enter() and gate.try_enter()
+    assert not gate.try_enter()
+    gate.leave()
+    assert gate.try_enter()
+    assert asyncio.run(gate.run(sum, [1, 2])) == 3
+
+
+def test_gate_holds_slot_until_cancelled_job_finishes():
+    gate = InferenceGate(max_inflight=1, max_queued=0)
+    started, release = threading.Event(), threading.Event()
+
+    def job():
+        started.set()
+        release.wait(5)
+
+    async def cancel_while_running():
+        assert gate.try_enter()
+        task = asyncio.ensure_future(gate.run(job))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_while_running())
+    assert gate.admitted == 1  # still running in the pool
+    release.set()
+    gate._executor.shutdown(wait=True)
+    assert gate.admitted == 0
+
+
+@pytest.mark.parametrize("inflight,queued", [(0, 8), (2, -1)])
+def test_gate_rejects_bad_sizes(inflight, queued):
+    with pytest.raises(ValueError):
+        InferenceGate(max_inflight=inflight, max_queued=queued)